@@ -27,7 +27,7 @@ def run_backtest(symbols, days = 365, use_regime=True, use_trend=True):
     print(f"Strategy Implemented (Regime: {use_regime}, Trend: {use_trend})")
     
     print("Running backtest engine...")
-    engine = BacktestEngine(strategy, data, symbols)
+    engine = BacktestEngine(strategy, data, symbols, vectorized=True)
     results = engine.run()
     print(f"Backtest complete: {results.shape[0]} equity points")
 
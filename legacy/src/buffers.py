@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity float history with O(1) appends.
+    
+    Every value is written twice, at slot i and i + capacity, so the most recent
+    values are always one contiguous run of the backing array: last_n() returns
+    a view (no copy, no wrap-around handling) and memory stays bounded no matter
+    how long the backtest runs.
+    """
+    
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Maximum number of most recent values that can be read back
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        
+        self.capacity = capacity
+        self.count = 0  # total values pushed, including ones that have rolled off
+        self._buf = np.zeros(2 * capacity, dtype=np.float64)
+    
+    def push(self, value: float):
+        """Append a value, evicting the oldest once capacity is reached."""
+        i = self.count % self.capacity
+        self._buf[i] = value
+        self._buf[i + self.capacity] = value
+        self.count += 1
+    
+    def last_n(self, n: int) -> np.ndarray:
+        """Read-only view of the n most recent values, oldest first."""
+        if not 0 <= n <= len(self):
+            raise ValueError(f"Cannot read {n} values from a buffer holding {len(self)}")
+        
+        end = (self.count - 1) % self.capacity + 1 + self.capacity
+        view = self._buf[end - n:end]
+        view.flags.writeable = False
+        return view
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
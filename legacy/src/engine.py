@@ -1,19 +1,23 @@
 import pandas as pd
 import numpy as np
-from collections import defaultdict
 from .visualizer import StrategyVisualizer
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from concurrent.futures import ThreadPoolExecutor
 
 @dataclass
 class LiveState:
-    history: list[float] = field(default_factory=list)
+    history: object = None       # bounded price history (RingBuffer), created by the strategy
     entry_mean: float = 0.0
     entry_std: float = 0.0
     pos: int = 0
     entry_price: float = 0.0
     cooldown: int = 0
     shares: int = 0          # add this, see next section
+    regime_state: object = None  # streaming RegimeDetector state, created by the strategy
+    window_shift: float = 0.0    # reference price the window sums are taken about
+    window_sum: float = 0.0      # running sum of (price - window_shift) over the strategy's lookback window
+    window_sumsq: float = 0.0    # running sum of (price - window_shift)**2 over the same window
+    trend_state: object = None   # streaming TrendDetector state, created by the strategy
 
 
 class BacktestEngine:
@@ -21,9 +25,11 @@ class BacktestEngine:
     Multithreaded event-driven backtesting engine.
     Each symbol runs in its own thread, synchronized only when capital changes.
     """
-    def __init__(self, strategy, data, symbols, initial_capital=10000, enable_visualizer=True):
+    def __init__(self, strategy, data, symbols, initial_capital=10000, enable_visualizer=True, vectorized=False):
         
         self.strategy = strategy
+        # Precompute each symbol's signals with strategy.run_vectorized instead of calling on_bar per bar
+        self.vectorized = vectorized
         self.data = data
         self.capital = initial_capital
         self.initial_capital = initial_capital
@@ -45,8 +51,6 @@ class BacktestEngine:
         Returns:
             pd.DataFrame: Equity curve.
         """
-        import threading
-        
         # Ensure data is sorted by time to simulate correctly
         is_multi_index = isinstance(self.data.index, pd.MultiIndex)
         
@@ -66,8 +70,9 @@ class BacktestEngine:
         for symbol in symbols:
             symbol_data_dict[symbol] = sorted_data[sorted_data['symbol'] == symbol].copy()
         
-        # Run each symbol in its own worker; each worker returns its own trades and equity points
-        all_equity_points = []
+        # Run each symbol in its own worker; each worker returns its own trades and equity arrays
+        all_timestamps = []
+        all_equity = []
         all_trades = []
 
         with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
@@ -78,15 +83,17 @@ class BacktestEngine:
 
             # Collect results from workers
             for future in futures:
-                trades, equity_points = future.result()
+                trades, timestamps, equity = future.result()
                 if trades:
                     all_trades.extend(trades)
-                if equity_points:
-                    all_equity_points.extend(equity_points)
+                if len(equity):
+                    all_timestamps.append(timestamps)
+                    all_equity.append(equity)
 
         # Consolidate equity: sum per timestamp across workers
-        if all_equity_points:
-            equity_df = pd.DataFrame(all_equity_points).set_index('timestamp')
+        if all_equity:
+            index = all_timestamps[0].append(all_timestamps[1:]).rename('timestamp')
+            equity_df = pd.DataFrame({'equity': np.concatenate(all_equity)}, index=index)
             # sum equities across workers for same timestamp
             equity_df = equity_df.groupby(level=0).sum()
             # store
@@ -101,23 +108,34 @@ class BacktestEngine:
 
     def _worker(self, symbol, symbol_data):
         """
-        Worker processes all bars for a single symbol and returns its trades and equity points.
+        Worker processes all bars for a single symbol and returns its trades and equity curve.
         No shared state is modified.
         Returns:
-            (trades_list, equity_points_list)
+            (trades_list, timestamps_index, equity_array)
         """
         state = LiveState()
         trades = []
         shares = 0
-        equity_points = []
+
+        # equity is written by position into a preallocated array; timestamps are the data index
+        equity_out = np.empty(len(symbol_data), dtype=np.float64)
 
         # allocate capital per worker (split initial capital evenly)
         per_worker_capital = float(self.initial_capital) / max(1, len(self.symbols))
         local_capital = per_worker_capital
 
-        for timestamp, row in symbol_data.iterrows():
-            price = row['close']
-            signal = self.strategy.on_bar(row, state)
+        # Bars are read from contiguous per-column arrays. The on_bar path hands each bar to the
+        # strategy as a plain dict (iterrows() would build a pandas Series, with dtype inference,
+        # for every bar); precomputed signals only need the close
+        closes = symbol_data['close'].to_numpy()
+        if self.vectorized:
+            signals = self.strategy.run_vectorized(closes)
+        else:
+            columns = list(symbol_data.columns)
+            rows = (dict(zip(columns, values)) for values in zip(*(symbol_data[column].to_numpy() for column in columns)))
+
+        for i, (timestamp, price) in enumerate(zip(symbol_data.index, closes)):
+            signal = signals[i] if self.vectorized else self.strategy.on_bar(next(rows), state)
 
             if signal == 1:
                 # Buy using available local capital
@@ -151,10 +169,9 @@ class BacktestEngine:
                     shares = 0
 
             # mark-to-market equity: cash + holdings value
-            equity = local_capital + shares * price
-            equity_points.append({'timestamp': timestamp, 'equity': equity})
+            equity_out[i] = local_capital + shares * price
 
-        return trades, equity_points
+        return trades, symbol_data.index, equity_out
     
 
 
@@ -175,58 +192,53 @@ class BacktestEngine:
             return {}
 
         equity = self.equity_df['equity']
-        returns = equity.pct_change().dropna()
+        values = equity.to_numpy(dtype=np.float64)
         
-        total_return = (equity.iloc[-1] - self.initial_capital) / self.initial_capital
+        total_return = (values[-1] - self.initial_capital) / self.initial_capital
         
         # Sharpe Ratio (assuming 252 trading days, risk-free rate 0 for simplicity)
         # If data is minute data, we need to scale appropriately.
         # Assuming minute data (252 * 390 minutes)
         # But returns are per step. Steps are irregular?
         # Let's resample to daily for Sharpe calculation to be standard
-        daily_equity = equity.resample('D').last().dropna()
-        daily_returns = daily_equity.pct_change().dropna()
+        daily_values = equity.resample('D').last().dropna().to_numpy(dtype=np.float64)
+        daily_returns = np.diff(daily_values) / daily_values[:-1]
+        daily_std = daily_returns.std(ddof=1) if len(daily_returns) > 1 else 0.0
         
-        if daily_returns.std() > 0:
-            sharpe_ratio = (daily_returns.mean() / daily_returns.std()) * np.sqrt(252)
+        if daily_std > 0:
+            sharpe_ratio = (daily_returns.mean() / daily_std) * np.sqrt(252)
         else:
             sharpe_ratio = 0.0
 
-        # Max Drawdown
-        rolling_max = equity.cummax()
-        drawdown = (equity - rolling_max) / rolling_max
-        max_drawdown = drawdown.min()
+        # Max Drawdown (single pass over the raw equity array)
+        rolling_max = np.maximum.accumulate(values)
+        max_drawdown = (values / rolling_max - 1.0).min()
 
         # Win Rate (based on closed trades)
         trades_df = self.get_trades()
         win_rate = 0.0
-        if not trades_df.empty:
-            # Pair buy/sells to calculate trade PnL roughly
-            # This is harder with multi-symbol. We need to group by symbol.
-            wins = 0
-            total_closed = 0
+        if not trades_df.empty and 'symbol' in trades_df.columns:
+            # Pair buy/sells per symbol by FIFO order: the n-th sell closes the n-th buy.
+            # Index both sides by (symbol, n) so all pairs are matched in one aligned subtraction.
+            sells = trades_df[trades_df['type'] == 'sell']
+            buys = trades_df[trades_df['type'] == 'buy']
             
-            for symbol in self.symbols:
-                sym_trades = trades_df[trades_df['symbol'] == symbol] if 'symbol' in trades_df.columns else pd.DataFrame()
-                if sym_trades.empty: continue
+            # Nothing is closed without both sides (the proceeds/cost columns only exist once a
+            # sell/buy has been recorded, e.g. not while the only position is still open)
+            if len(sells) and len(buys):
+                proceeds = sells.set_index(['symbol', sells.groupby('symbol').cumcount()])['proceeds']
+                costs = buys.set_index(['symbol', buys.groupby('symbol').cumcount()])['cost']
                 
-                sells = sym_trades[sym_trades['type'] == 'sell']
-                buys = sym_trades[sym_trades['type'] == 'buy']
+                pnl = (proceeds - costs).dropna()
+                pnl = pnl[pnl.index.get_level_values('symbol').isin(self.symbols)]
                 
-                # Simple FIFO matching
-                for i in range(len(sells)):
-                    if i < len(buys):
-                        pnl = sells.iloc[i]['proceeds'] - buys.iloc[i]['cost']
-                        if pnl > 0: wins += 1
-                        total_closed += 1
-            
-            win_rate = wins / total_closed if total_closed > 0 else 0.0
+                win_rate = float((pnl > 0).mean()) if len(pnl) > 0 else 0.0
 
         return {
             "Total Return": f"{total_return:.2%}",
             "Sharpe Ratio": f"{sharpe_ratio:.2f}",
             "Max Drawdown": f"{max_drawdown:.2%}",
             "Win Rate": f"{win_rate:.2%}",
-            "Final Equity": f"${equity.iloc[-1]:.2f}",
+            "Final Equity": f"${values[-1]:.2f}",
             "Total Trades": len(trades_df)
         }
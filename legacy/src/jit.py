@@ -0,0 +1,43 @@
+import os
+
+# Compiled kernels are written to disk so later runs (parameter sweeps, repeated
+# backtests) load machine code instead of recompiling on first call.
+os.environ.setdefault(
+    "NUMBA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".numba_cache"),
+)
+
+try:
+    import numba
+    from numba import prange
+    USE_NUMBA = True
+    NUM_THREADS = numba.config.NUMBA_NUM_THREADS
+except ImportError:
+    numba = None
+    prange = range
+    USE_NUMBA = False
+    NUM_THREADS = 1
+
+
+def njit(*args, **kwargs):
+    """
+    Drop-in for numba.njit that defaults to cache=True.
+
+    Kernels should be plain module-level functions: numba already keeps one
+    compiled specialization per argument-type signature, so every strategy
+    shape gets its own machine code without a factory or lru_cache (closures
+    built inside a factory cannot be cached to disk).
+
+    Without numba installed the function is returned unchanged and runs as
+    ordinary Python/NumPy.
+    """
+    if args and callable(args[0]):
+        return njit(**kwargs)(args[0])
+
+    def decorator(func):
+        if not USE_NUMBA:
+            return func
+        kwargs.setdefault("cache", True)
+        return numba.njit(*args, **kwargs)(func)
+
+    return decorator
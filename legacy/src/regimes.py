@@ -1,6 +1,20 @@
+import math
 import numpy as np
-from collections import defaultdict
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from dataclasses import dataclass, field
+from numpy.lib.stride_tricks import sliding_window_view
 from enum import Enum
+from .jit import njit, USE_NUMBA
+from .stats import sorted_quantile, sorted_quantile_jit
+
+try:
+    import bottleneck as bn
+except ImportError:
+    bn = None
+
+# Annualization for minute-bar volatility: sqrt(252 trading days * 390 minutes)
+_ANNUALIZATION = math.sqrt(252 * 390)
 
 class VolatilityRegime(Enum):
     """Volatility regime classifications"""
@@ -9,6 +23,82 @@ class VolatilityRegime(Enum):
     HIGH = "high"
     EXTREME = "extreme"
 
+# Regimes in order of increasing volatility; index = number of thresholds (p25, p75, p90) at or below current vol
+_REGIMES_BY_RANK = (VolatilityRegime.LOW, VolatilityRegime.NORMAL, VolatilityRegime.HIGH, VolatilityRegime.EXTREME)
+
+# Plain int regime codes (ranks) for per-bar comparisons; _REGIMES_BY_RANK[code] is the enum
+LOW, NORMAL, HIGH, EXTREME = range(4)
+
+
+def _regime_thresholds(sorted_vols) -> tuple:
+    """(p25, p75, p90) of the sorted historical window vols; the regime boundaries."""
+    return (
+        sorted_quantile(sorted_vols, 0.25),
+        sorted_quantile(sorted_vols, 0.75),
+        sorted_quantile(sorted_vols, 0.90),
+    )
+
+
+@njit
+def _regime_kernel(prices, regime_window):
+    """
+    Compiled end-to-end version of RegimeDetector.calculate for the last lookback_window prices.
+    
+    Returns:
+        (regime rank 0-3 into _REGIMES_BY_RANK, current annualized vol, current percentile)
+    """
+    n = len(prices) - 1
+    returns = np.empty(n)
+    for i in range(n):
+        returns[i] = (prices[i + 1] - prices[i]) / prices[i]
+    
+    # Rolling volatility of every regime_window slice (two-pass mean / squared deviations)
+    num_windows = n - regime_window + 1
+    vols = np.empty(num_windows)
+    sq_dev = 0.0
+    for j in range(num_windows):
+        total = 0.0
+        for k in range(j, j + regime_window):
+            total += returns[k]
+        mean = total / regime_window
+        sq_dev = 0.0
+        for k in range(j, j + regime_window):
+            d = returns[k] - mean
+            sq_dev += d * d
+        vols[j] = math.sqrt(sq_dev / (regime_window - 1)) * _ANNUALIZATION
+    
+    # Current volatility is the last window, as a population std
+    current_vol = math.sqrt(sq_dev / regime_window) * _ANNUALIZATION
+    
+    vols.sort()
+    rank = 0
+    for q in (0.25, 0.75, 0.90):
+        if current_vol >= sorted_quantile_jit(vols, q):
+            rank += 1
+    
+    percentile = np.searchsorted(vols, current_vol) / num_windows * 100
+    return rank, current_vol, percentile
+
+
+@dataclass(slots=True)
+class RegimeState:
+    """
+    Per-symbol streaming state for RegimeDetector.update.
+    Owned by the strategy (like price history); create with RegimeDetector.new_state().
+    All per-symbol fields live in one slotted record, so readers need a single lookup.
+    """
+    regime: int = NORMAL         # current regime code (LOW..EXTREME)
+    volatility: float = 0.0      # current annualized volatility
+    percentile: float = 0.0      # current volatility's percentile in the historical distribution
+    bars: int = 0
+    last_price: float = 0.0
+    returns: deque = field(default_factory=deque)       # last regime_window returns
+    ret_sum: float = 0.0
+    ret_sumsq: float = 0.0
+    window_vols: deque = field(default_factory=deque)   # rolling vols in arrival order
+    sorted_vols: list = field(default_factory=list)     # same vols, kept sorted for percentile lookups
+
+
 class RegimeDetector:
     """
     Detects volatility regimes based on rolling standard deviation of returns.
@@ -32,6 +122,97 @@ class RegimeDetector:
         """
         self.lookback_window = lookback_window
         self.regime_window = regime_window
+    
+    def new_state(self) -> RegimeState:
+        """Create empty streaming state sized for this detector's windows."""
+        return RegimeState(
+            returns=deque(maxlen=self.regime_window),
+            window_vols=deque(maxlen=self.lookback_window - self.regime_window),
+        )
+    
+    def update(self, state: RegimeState, price: float) -> int:
+        """
+        Streaming equivalent of calculate(): feed one new price per bar.
+        
+        Keeps running sums over the regime window and a sorted window of historical
+        volatilities, so each bar costs O(log lookback) instead of re-slicing the history.
+        
+        Args:
+            state: Per-symbol state from new_state()
+            price: Latest close
+            
+        Returns:
+            Current regime code (LOW, NORMAL, HIGH, EXTREME); _REGIMES_BY_RANK maps it to VolatilityRegime
+        """
+        state.bars += 1
+        returns = state.returns
+        
+        if state.bars > 1:
+            ret = (price - state.last_price) / state.last_price
+            if len(returns) == returns.maxlen:
+                evicted = returns[0]
+                state.ret_sum -= evicted
+                state.ret_sumsq -= evicted * evicted
+            returns.append(ret)
+            state.ret_sum += ret
+            state.ret_sumsq += ret * ret
+            
+            # Periodically re-sum from the window so add/subtract rounding cannot drift
+            if state.bars % self.lookback_window == 0:
+                state.ret_sum = math.fsum(returns)
+                state.ret_sumsq = math.fsum(r * r for r in returns)
+        state.last_price = price
+        
+        # Need enough data to calculate volatility
+        n = self.regime_window
+        if len(returns) < n:
+            return NORMAL
+        
+        # Sum of squared deviations over the regime window
+        sq_dev = max(state.ret_sumsq - state.ret_sum * state.ret_sum / n, 0.0)
+        current_vol = math.sqrt(sq_dev / n) * _ANNUALIZATION
+        
+        # Add this window's (sample) vol to the historical distribution, evicting the oldest
+        window_vols = state.window_vols
+        sorted_vols = state.sorted_vols
+        if len(window_vols) == window_vols.maxlen:
+            del sorted_vols[bisect_left(sorted_vols, window_vols[0])]
+        window_vol = math.sqrt(sq_dev / (n - 1)) * _ANNUALIZATION
+        window_vols.append(window_vol)
+        insort(sorted_vols, window_vol)
+        
+        state.volatility = current_vol
+        
+        # Need lookback window to establish regime thresholds
+        if state.bars < self.lookback_window:
+            return NORMAL
+        
+        thresholds = _regime_thresholds(sorted_vols)
+        state.percentile = bisect_left(sorted_vols, current_vol) / len(sorted_vols) * 100
+        state.regime = bisect_right(thresholds, current_vol)
+        return state.regime
+    
+    def calculate_series(self, price_history) -> np.ndarray:
+        """
+        Regime rank (index into _REGIMES_BY_RANK) for every bar of a full price series.
+        
+        Replays update() on a fresh state, so each bar gets exactly the regime a
+        streaming strategy would have seen at that point (no look-ahead).
+        """
+        state = self.new_state()
+        ranks = np.empty(len(price_history), dtype=np.int8)
+        for t, price in enumerate(price_history):
+            ranks[t] = self.update(state, price)
+        return ranks
+    
+    def get_regime_stats(self, state: RegimeState) -> dict:
+        """Latest regime, volatility and percentile recorded in a symbol's streaming state."""
+        return {
+            "regime": _REGIMES_BY_RANK[state.regime].value,
+            "volatility": state.volatility,
+            "percentile": state.percentile,
+            "description": self._get_regime_description(_REGIMES_BY_RANK[state.regime]),
+        }
         
     def calculate(self, price_history: list) -> VolatilityRegime:
         """
@@ -47,48 +228,36 @@ class RegimeDetector:
         if len(price_history) < self.regime_window + 1:
             return VolatilityRegime.NORMAL
         
-        # Calculate returns for regime window
-        prices = np.array(price_history[-self.regime_window-1:])
-        returns = np.diff(prices) / prices[:-1]
-        
-        # Current volatility (annualized standard deviation of returns)
-        # Assuming minute bars: sqrt(252 * 390) to annualize
-        current_vol = np.std(returns) * np.sqrt(252 * 390)
-        
         # Need lookback window to establish regime thresholds
         if len(price_history) < self.lookback_window:
             return VolatilityRegime.NORMAL
         
-        # Calculate historical volatility distribution using vectorized operations
-        lookback_prices = np.array(price_history[-self.lookback_window:])
+        if USE_NUMBA:
+            rank, _, _ = _regime_kernel(np.asarray(price_history[-self.lookback_window:], dtype=np.float64),
+                                        self.regime_window)
+            return _REGIMES_BY_RANK[rank]
         
-        # Calculate all returns at once
+        # Calculate all lookback returns at once; the regime window is their suffix
+        lookback_prices = np.asarray(price_history[-self.lookback_window:], dtype=np.float64)
         all_returns = np.diff(lookback_prices) / lookback_prices[:-1]
         
-        # Use rolling window std calculation (more efficient)
-        # Calculate rolling std using pandas for efficiency
-        import pandas as pd
-        returns_series = pd.Series(all_returns)
-        rolling_std = returns_series.rolling(window=self.regime_window).std()
-        historical_vols = rolling_std.dropna().values * np.sqrt(252 * 390)
-        
-        # Calculate percentile thresholds
-        p25 = np.percentile(historical_vols, 25)
-        p75 = np.percentile(historical_vols, 75)
-        p90 = np.percentile(historical_vols, 90)
-        
-        # Calculate current percentile
-        percentile = (historical_vols < current_vol).sum() / len(historical_vols) * 100
-        
-        # Classify regime
-        if current_vol < p25:
-            regime = VolatilityRegime.LOW
-        elif current_vol < p75:
-            regime = VolatilityRegime.NORMAL
-        elif current_vol < p90:
-            regime = VolatilityRegime.HIGH
+        # Current volatility (annualized standard deviation of returns)
+        current_vol = np.std(all_returns[-self.regime_window:]) * _ANNUALIZATION
+        
+        # Rolling (sample) std over every regime_window slice: bottleneck's O(n) moving std
+        # when installed, else a strided view (no copies) reduced per window
+        if bn is not None:
+            historical_vols = bn.move_std(all_returns, window=self.regime_window, ddof=1)[self.regime_window - 1:]
         else:
-            regime = VolatilityRegime.EXTREME
+            historical_vols = sliding_window_view(all_returns, self.regime_window).std(axis=1, ddof=1)
+        historical_vols = historical_vols * _ANNUALIZATION
+        
+        # Sort once: all three thresholds become index lookups
+        historical_vols.sort()
+        thresholds = _regime_thresholds(historical_vols)
+        
+        # Classify regime: LOW < p25 <= NORMAL < p75 <= HIGH < p90 <= EXTREME
+        regime = _REGIMES_BY_RANK[bisect_right(thresholds, current_vol)]
         
         return regime
     
@@ -0,0 +1,21 @@
+import numpy as np
+from .jit import njit
+
+
+def sorted_quantile(sorted_values, q: float) -> float:
+    """
+    Linearly interpolated quantile (np.quantile's default method) of already sorted values:
+    O(1) index arithmetic instead of a partition of the data.
+
+    Plain scalar arithmetic, so it accepts a Python list (RegimeDetector's streaming window)
+    as well as an array; sorted_quantile_jit is the same function for @njit kernels.
+    """
+    last = len(sorted_values) - 1
+    pos = q * last
+    lo = int(pos)
+    hi = min(lo + 1, last)
+    # float64 weight, so float32 values (Monte Carlo paths) are still interpolated in float64
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * np.float64(pos - lo)
+
+
+sorted_quantile_jit = njit(sorted_quantile)
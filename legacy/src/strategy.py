@@ -1,13 +1,80 @@
+import math
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from abc import ABC, abstractmethod
-from collections import defaultdict
-from .regimes import RegimeDetector, VolatilityRegime
-from .trends import TrendDetector, TrendDirection
+from .buffers import RingBuffer
+from .jit import njit
+from .regimes import RegimeDetector, LOW, HIGH, EXTREME
+from .trends import TrendDetector, DOWN
+
+# Target working-set size (bytes) for blocks of rolling windows in BuyLow.run_vectorized
+_BLOCK_BYTES = 1 << 20
 
-class Strategy(ABC):
-    def __init__(self):
-        self.pos = defaultdict(int)
 
+@njit
+def _buylow_signals(prices, window_mean, window_std, regime_rank, trend_code, timeframe,
+                    entry_threshold, exit_threshold, stop_loss, cooldown_period, use_regime, use_trend):
+    """
+    BuyLow.on_bar's position state machine over precomputed per-bar inputs.
+    
+    regime_rank holds regime codes (LOW..EXTREME) and trend_code trend codes (DOWN, FLAT, UP).
+    Returns the signal (1, -1, 0) for every bar.
+    """
+    n = len(prices)
+    signals = np.zeros(n, dtype=np.int8)
+    pos = 0
+    cooldown = 0
+    entry_mean = 0.0
+    entry_std = 0.0
+    for t in range(timeframe, n):
+        price = prices[t]
+        mean_price = entry_mean if entry_mean > 0 else window_mean[t]
+        std_dev = entry_std if entry_std > 0 else window_std[t]
+        if std_dev < 1e-6:
+            continue
+        z_score = (price - mean_price) / std_dev
+        
+        entry_thr = entry_threshold
+        exit_thr = exit_threshold
+        stop_thr = stop_loss
+        if use_regime:
+            rank = regime_rank[t]
+            if rank == LOW:
+                entry_thr *= 0.7
+                exit_thr *= 0.8
+                stop_thr *= 0.8
+            elif rank == HIGH:
+                entry_thr *= 1.3
+                exit_thr *= 1.2
+                stop_thr *= 1.2
+            elif rank == EXTREME:
+                if pos == 0:
+                    continue
+                exit_thr *= 1.5
+                stop_thr *= 1.5
+        
+        if cooldown > 0:
+            cooldown -= 1
+        
+        if pos == 1:
+            cooldown = cooldown_period
+            if z_score < -stop_thr or z_score > exit_thr:
+                pos = 0
+                signals[t] = -1
+                continue
+        
+        if use_trend and trend_code[t] == DOWN:
+            continue
+        
+        if pos == 0 and z_score < -entry_thr and cooldown <= 0:
+            pos = 1
+            entry_std = window_std[t]
+            entry_mean = window_mean[t]
+            signals[t] = 1
+    return signals
+
+
+class Strategy(ABC):
     @abstractmethod
     def on_bar(self, symbol, bar):
         """
@@ -70,28 +137,81 @@ class BuyLow(Strategy):
         self.cooldown_period = 30
 
     def on_bar(self, bar ,st ):
-        st.history.append(bar['close'])
+        # Values read several times per bar are looked up once
+        close = bar['close']
+        tf = self.timeframe_minutes
         
-        # Need at least timeframe_minutes bars to calculate meaningful statistics
-        if len(st.history) <= self.timeframe_minutes:
-            return 0
+        # Bounded history: the z-score window, the current bar and the close leaving the window
+        history = st.history
+        if history is None:
+            history = st.history = RingBuffer(tf + 2)
+        history.push(close)
+
+        # Running sum and sum of squares of the z-score window (the timeframe_minutes bars before
+        # the current one): the previous close enters, the close timeframe_minutes + 1 bars back
+        # leaves. Both are taken about window_shift (a recent price) so the variance does not
+        # come from subtracting two huge, nearly equal numbers
+        count = history.count
+        if count == 1:
+            st.window_shift = float(close)
+        if count >= 2:
+            edge = history.last_n(min(len(history), tf + 2))
+            entering = edge[-2] - st.window_shift
+            st.window_sum += entering
+            st.window_sumsq += entering * entering
+            if count >= tf + 2:
+                leaving = edge[0] - st.window_shift
+                st.window_sum -= leaving
+                st.window_sumsq -= leaving * leaving
+        
+        # Trend detector keeps its own window and log returns in st, updated in O(1) every bar
+        trend_detector = self.trend_detector if self.use_trend else None
+        if trend_detector:
+            if st.trend_state is None:
+                st.trend_state = trend_detector.new_state()
+            trend_detector.update(st.trend_state, close)
         
-        # Update regime detector if enabled (pass history, don't let it store)
+        # Update regime detector if enabled. It is streaming (O(log n) per bar), so it must
+        # see every bar, including warm-up; its per-symbol state lives in st
         if self.use_regime and self.regime_detector:
-            regime = self.regime_detector.calculate(st.history)
+            if st.regime_state is None:
+                st.regime_state = self.regime_detector.new_state()
+            regime = self.regime_detector.update(st.regime_state, close)
         
-        # Update trend detector if enabled (pass history, don't let it store)
-        if self.use_trend and self.trend_detector:
-            trend = self.trend_detector.calculate(st.history)
+        # Need at least timeframe_minutes bars to calculate meaningful statistics
+        if count <= tf:
+            return 0
         
         # Get price history for the specified timeframe (excluding current)
-        lookback_prices = np.array(st.history[-self.timeframe_minutes-1:-1])
-        current_price = st.history[-1]
+        recent = history.last_n(tf + 1)
+        lookback_prices = recent[:-1]
+        current_price = recent[-1]
+
+        # Re-sum once per window (about a fresh shift) so floating-point drift from the running
+        # updates can't build up
+        if count % tf == 0:
+            st.window_shift = float(lookback_prices[-1])
+            deviations = lookback_prices - st.window_shift
+            st.window_sum = float(deviations.sum())
+            st.window_sumsq = float(deviations @ deviations)
+        
+        # O(1) window mean and population std from the running sums
+        shifted_mean = st.window_sum / tf
+        window_mean = st.window_shift + shifted_mean
+        window_std = math.sqrt(max(st.window_sumsq / tf - shifted_mean * shifted_mean, 0.0))
+        
+        # Short-circuit: once entry stats are set (after the first entry), a held position only
+        # checks its exits against entry_mean/entry_std, and a flat position with more than one
+        # bar of cooldown left cannot enter, so neither needs the trend
+        frozen = st.entry_mean > 0 and st.entry_std > 0
+        trend = None
+        if trend_detector and not (frozen and (st.pos == 1 or st.cooldown > 1)):
+            trend = trend_detector.evaluate(st.trend_state)
         
         # Calculate statistical measures
-        mean_price = st.entry_mean if st.entry_mean > 0 else np.mean(lookback_prices)
+        mean_price = st.entry_mean if st.entry_mean > 0 else window_mean
         
-        std_dev =  st.entry_std if st.entry_std > 0 else np.std(lookback_prices)
+        std_dev =  st.entry_std if st.entry_std > 0 else window_std
         
         # Avoid division by zero
         if std_dev < 1e-6:
@@ -107,17 +227,17 @@ class BuyLow(Strategy):
         stop_loss_threshold = self.stop_loss
         
         if  self.use_regime:            
-            if regime == VolatilityRegime.LOW:
+            if regime == LOW:
                 # In low volatility, use tighter thresholds (more sensitive)
                 entry_threshold *= 0.7
                 exit_threshold *= 0.8
                 stop_loss_threshold *= 0.8
-            elif regime == VolatilityRegime.HIGH:
+            elif regime == HIGH:
                 # In high volatility, use wider thresholds (less sensitive)
                 entry_threshold *= 1.3
                 exit_threshold *= 1.2
                 stop_loss_threshold *= 1.2
-            elif regime == VolatilityRegime.EXTREME:
+            elif regime == EXTREME:
                 # In extreme volatility, avoid new entries or use very wide thresholds
                 if st.pos == 0:
                     return 0  
@@ -143,7 +263,7 @@ class BuyLow(Strategy):
 
         # Trend Filter
         if self.use_trend:
-            if trend == TrendDirection.DOWN:
+            if trend == DOWN:
                 return 0
 
         
@@ -151,8 +271,57 @@ class BuyLow(Strategy):
         if st.pos == 0 and z_score < -entry_threshold and st.cooldown <= 0:
             st.pos = 1
             st.entry_price = current_price
-            st.entry_std = np.std(lookback_prices)
-            st.entry_mean = np.mean(lookback_prices)
+            st.entry_std = window_std
+            st.entry_mean = window_mean
             return 1
 
         return 0
+
+    def run_vectorized(self, prices) -> np.ndarray:
+        """
+        Signals for a whole price series in one call, for batch backtests.
+        
+        Produces the same signals as calling on_bar on every bar of a fresh state:
+        rolling window mean/std, regimes and trends are computed for the full series up
+        front, then a compiled state machine walks them once. Live trading keeps using
+        the streaming on_bar.
+        
+        Args:
+            prices: 1-D array of close prices, oldest first, or a 2-D (bars x symbols) array
+                for several symbols on a shared bar clock; each column is an independent symbol
+            
+        Returns:
+            np.ndarray of int8 signals (1 buy, -1 sell, 0 hold), same shape as prices
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.ndim == 1:
+            return self.run_vectorized(prices[:, None])[:, 0]
+        
+        n, num_symbols = prices.shape
+        tf = self.timeframe_minutes
+        window_mean = np.zeros((n, num_symbols))
+        window_std = np.zeros((n, num_symbols))
+        
+        # Bar t uses the tf closes before it, i.e. window row t - tf of prices[:-1];
+        # every symbol's windows are reduced in the same NumPy call
+        if n > tf:
+            windows = sliding_window_view(prices[:-1], tf, axis=0)
+            rows = max(1, _BLOCK_BYTES // (tf * num_symbols * 8))
+            for start in range(0, len(windows), rows):
+                block = windows[start:start + rows]
+                window_mean[tf + start:tf + start + len(block)] = block.mean(axis=-1)
+                window_std[tf + start:tf + start + len(block)] = block.std(axis=-1)
+        
+        use_regime = bool(self.use_regime and self.regime_detector)
+        use_trend = bool(self.use_trend and self.trend_detector)
+        no_codes = np.zeros(n, dtype=np.int8)
+        signals = np.empty((n, num_symbols), dtype=np.int8)
+        for j in range(num_symbols):
+            column = np.ascontiguousarray(prices[:, j])
+            regime_rank = self.regime_detector.calculate_series(column) if use_regime else no_codes
+            trend_code = self.trend_detector.calculate_series(column) if use_trend else no_codes
+            signals[:, j] = _buylow_signals(column, np.ascontiguousarray(window_mean[:, j]),
+                                            np.ascontiguousarray(window_std[:, j]), regime_rank, trend_code,
+                                            tf, float(self.factor[0]), float(self.factor[1]),
+                                            float(self.stop_loss), self.cooldown_period, use_regime, use_trend)
+        return signals
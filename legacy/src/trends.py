@@ -1,12 +1,156 @@
+import math
 import numpy as np
-from collections import defaultdict
+from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
+from .buffers import RingBuffer
+from .jit import njit, prange, USE_NUMBA, NUM_THREADS
 
 class TrendDirection(Enum):
     DOWN = "down"
     FLAT = "flat"
     UP = "up"
 
+# Kernel result codes; index into this tuple
+_TRENDS_BY_CODE = (TrendDirection.DOWN, TrendDirection.FLAT, TrendDirection.UP)
+
+# Plain int trend codes for per-bar comparisons; _TRENDS_BY_CODE[code] is the enum
+DOWN, FLAT, UP = range(3)
+
+# Placeholder for "no precomputed log returns" in kernel calls
+_NO_RETURNS = np.empty(0)
+
+# Below this many symbols thread start-up costs more than calculate_batch's NumPy path
+_PARALLEL_MIN_SYMBOLS = 32
+
+# Without numba, lookbacks up to this size run _trend_code as plain Python over lists: for
+# short windows NumPy's per-call dispatch costs more than the arithmetic itself
+_SCALAR_MAX_LOOKBACK = 64
+
+# _trend_kernel is compiled eagerly at import (and then loaded from the on-disk cache) rather
+# than on the first bar, for C-contiguous float64 prices and returns, writable or read-only
+# (RingBuffer views are read-only)
+if USE_NUMBA:
+    from numba import types
+    _ARRAYS = (types.float64[::1], types.Array(types.float64, 1, 'C', readonly=True))
+    _TREND_SIGNATURES = [
+        types.int64(prices, returns, types.int64, types.float64, types.float64, types.int64, types.float64)
+        for prices in _ARRAYS for returns in _ARRAYS
+    ]
+else:
+    _TREND_SIGNATURES = None
+
+
+@njit
+def _trend_code(prices, returns, lookback, slope_threshold, mom_threshold, ac_lag, ac_threshold):
+    """_trend_kernel's three sub-signals over prices and their returns, one pass over each array."""
+    n = len(prices)
+    
+    # 1) Linear regression slope, closed form on centered x = 0..lb-1. Centered x sums to
+    #    zero, so sum((x - x_mean) * y) already is the covariance term: one pass over y
+    lb = min(lookback, n)
+    x_mean = (lb - 1) / 2.0
+    y_sum = 0.0
+    sxy = 0.0
+    for i in range(lb):
+        y = prices[n - lb + i]
+        y_sum += y
+        sxy += (i - x_mean) * y
+    y_mean = y_sum / lb
+    sxx = lb * (lb * lb - 1) / 12.0
+    slope = sxy / sxx if sxx > 0 else 0.0
+    norm_slope = slope / y_mean if y_mean > 0 else 0.0
+    if norm_slope < -slope_threshold:
+        return DOWN
+    
+    # 2) + 3) One pass over the lookback returns accumulates the momentum total and the raw
+    #    sums of the autocorrelation's lagged pairs (a, b) = (r[i], r[i + ac_lag])
+    m = n - 1
+    lb = min(lookback, m)
+    start = m - lb
+    k = lb - ac_lag
+    total = 0.0
+    sum0 = 0.0
+    sum1 = 0.0
+    sq0 = 0.0
+    sq1 = 0.0
+    prod = 0.0
+    for i in range(lb):
+        r = returns[start + i]
+        total += r
+        if i < k:
+            b = returns[start + ac_lag + i]
+            sum0 += r
+            sum1 += b
+            sq0 += r * r
+            sq1 += b * b
+            prod += r * b
+    
+    # 2) Time-series momentum: mean return over the lookback
+    if lb >= 5 and total / lb < -mom_threshold:
+        return DOWN
+    
+    # 3) Lag-ac_lag autocorrelation of returns (Pearson from the raw sums)
+    if lb > ac_lag + 5:
+        cross = prod - sum0 * sum1 / k
+        ss0 = max(sq0 - sum0 * sum0 / k, 0.0)
+        ss1 = max(sq1 - sum1 * sum1 / k, 0.0)
+        ac = cross / (math.sqrt(ss0) * math.sqrt(ss1) + 1e-12)
+        if ac < -ac_threshold:
+            return DOWN
+    
+    return UP
+
+
+@njit(_TREND_SIGNATURES)
+def _trend_kernel(prices, log_returns, lookback, slope_threshold, mom_threshold, ac_lag, ac_threshold):
+    """
+    Compiled end-to-end version of TrendDetector.calculate.
+    
+    log_returns may hold the len(prices) - 1 log returns of prices, maintained incrementally
+    by the caller; pass an empty array to have them computed here.
+    
+    Returns:
+        Trend code: DOWN if any sub-signal is DOWN, else UP
+    """
+    n = len(prices)
+    positive = True
+    for i in range(n):
+        if prices[i] <= 0:
+            positive = False
+            break
+    
+    if positive and len(log_returns) == n - 1:
+        return _trend_code(prices, log_returns, lookback, slope_threshold, mom_threshold, ac_lag, ac_threshold)
+    
+    returns = np.empty(n - 1)
+    for i in range(n - 1):
+        if positive:
+            returns[i] = math.log(prices[i + 1]) - math.log(prices[i])
+        else:
+            returns[i] = (prices[i + 1] - prices[i]) / max(prices[i], 1e-12)
+    return _trend_code(prices, returns, lookback, slope_threshold, mom_threshold, ac_lag, ac_threshold)
+
+
+@njit(parallel=True)
+def _trend_batch(prices, lookback, slope_threshold, mom_threshold, ac_lag, ac_threshold, out):
+    """_trend_kernel on every row of prices (one symbol's window per row); rows run in parallel."""
+    no_returns = np.empty(0)
+    for s in prange(prices.shape[0]):
+        out[s] = _trend_kernel(prices[s], no_returns, lookback, slope_threshold, mom_threshold, ac_lag, ac_threshold)
+    return out
+
+
+@dataclass(slots=True)
+class TrendState:
+    """One symbol's trend window, its log returns and the latest trend, from TrendDetector.new_state()."""
+    prices: RingBuffer          # last lookback + 1 prices
+    log_returns: RingBuffer     # their log returns, one new value per bar (NaN next to a nonpositive price)
+    last_log_price: float = math.nan
+    trend: int = FLAT           # latest trend code (DOWN, FLAT, UP) from evaluate()
+    nonpositive: int = 0        # how many of the buffered prices are <= 0
+
+
 class TrendDetector:
     """
     Trend detector using:
@@ -33,17 +177,86 @@ class TrendDetector:
 
         self.min_bars = lookback
 
-
+        # Centered regression x-axis and its sum of squares for full lookback windows,
+        # built once instead of per bar (see _lr_axis)
+        self._x, self._sxx = self._lr_axis(lookback)
+
+    def new_state(self) -> TrendState:
+        """Create empty streaming state sized for this detector's lookback."""
+        return TrendState(prices=RingBuffer(self.lookback + 1), log_returns=RingBuffer(self.lookback))
+
+    def update(self, state: TrendState, price: float):
+        """
+        Feed one new price per bar (O(1): one log per bar instead of np.log over the window).
+        Call evaluate(state) on the bars where the trend is actually needed.
+        """
+        log_price = math.log(price) if price > 0 else math.nan
+        if state.prices.count:
+            state.log_returns.push(log_price - state.last_log_price)
+        
+        # Count nonpositive prices as they enter and leave the window, so evaluate() knows
+        # whether the log returns are usable without scanning the window
+        if state.nonpositive and len(state.prices) == state.prices.capacity \
+                and state.prices.last_n(state.prices.capacity)[0] <= 0:
+            state.nonpositive -= 1
+        if price <= 0:
+            state.nonpositive += 1
+        
+        state.prices.push(price)
+        state.last_log_price = log_price
+
+    def evaluate(self, state: TrendState) -> int:
+        """
+        Trend code (DOWN, FLAT, UP) for the prices fed to update() so far; also recorded in state.trend.
+        FLAT until update() has seen at least two prices (there is no return to measure yet).
+        """
+        n = len(state.prices)
+        if n < 2:
+            state.trend = FLAT
+            return FLAT
+        prices = state.prices.last_n(n)
+        if state.nonpositive:
+            state.trend = self.calculate_code(prices)
+        else:
+            state.trend = self._classify(prices, state.log_returns.last_n(n - 1))
+        return state.trend
 
     def calculate(self,  price_history: list) -> TrendDirection:
-
-
-        prices = np.asarray(price_history, dtype=np.float64)
+        return _TRENDS_BY_CODE[self.calculate_code(price_history)]
+
+    def calculate_code(self, price_history, log_returns=None) -> int:
+        """
+        Same as calculate(), as an int code (DOWN, FLAT, UP) for per-bar comparisons.
+        
+        log_returns: optional log returns of price_history (one fewer element), kept up to date
+        incrementally by the caller so they are not recomputed from the whole window every bar.
+        Ignored when the window has nonpositive prices (simple returns are used then).
+        """
+        prices = np.ascontiguousarray(price_history, dtype=np.float64)
+        
+        if USE_NUMBA:
+            returns = _NO_RETURNS if log_returns is None else np.ascontiguousarray(log_returns, dtype=np.float64)
+            return _trend_kernel(prices, returns, self.lookback,
+                                 self.slope_threshold, self.mom_threshold, self.ac_lag, self.ac_threshold)
+        
         if np.any(prices <= 0):
             # if your asset can be <=0 (rare), switch to simple returns
             returns = np.diff(prices) / np.maximum(prices[:-1], 1e-12)
+        elif log_returns is not None:
+            returns = log_returns
         else:
             returns = np.diff(np.log(prices))
+        return self._classify(prices, returns)
+
+    def _classify(self, prices: np.ndarray, returns: np.ndarray) -> int:
+        """Trend code from a price window and its returns, already checked and computed by the caller."""
+        if USE_NUMBA:
+            return _trend_code(prices, returns, self.lookback,
+                               self.slope_threshold, self.mom_threshold, self.ac_lag, self.ac_threshold)
+        if self.lookback <= _SCALAR_MAX_LOOKBACK:
+            lb = self.lookback
+            return _trend_code(prices[-(lb + 1):].tolist(), returns[-lb:].tolist(), lb,
+                               self.slope_threshold, self.mom_threshold, self.ac_lag, self.ac_threshold)
 
         # 1) Linear regression slope (existing idea)
         trend_lr, lr_strength = self._detect_lr_trend(prices)
@@ -55,24 +268,143 @@ class TrendDetector:
         trend_ac, ac_strength = self._detect_autocorr_trend(returns)
     
         if trend_lr == TrendDirection.DOWN or trend_mom == TrendDirection.DOWN or trend_ac == TrendDirection.DOWN:
-            trend = TrendDirection.DOWN
-
-        else: 
-            trend = TrendDirection.UP
-
-        return trend
-
-
+            return DOWN
+        return UP
+
+    def calculate_series(self, price_history) -> np.ndarray:
+        """
+        Trend for every bar of a full price series, for batch backtests.
+        
+        Element t is calculate_code(prices[max(0, t - lookback):t + 1]).
+        Full windows are evaluated at once with rolling sums (np.correlate over the series)
+        instead of one calculate() call per bar.
+        """
+        prices = np.asarray(price_history, dtype=np.float64)
+        n = len(prices)
+        lb = self.lookback
+        codes = np.full(n, UP, dtype=np.int8)
+        
+        # The first lookback bars (partial windows), and any series that needs the
+        # simple-return fallback, go through calculate() bar by bar
+        per_bar = range(n) if np.any(prices <= 0) else range(min(lb, n))
+        for t in per_bar:
+            codes[t] = self.calculate_code(prices[max(0, t - lb):t + 1])
+        if n <= lb or len(per_bar) == n:
+            return codes
+        
+        # Full windows t = lb..n-1 hold prices[t-lb:t+1] and returns[t-lb:t]
+        returns = np.diff(np.log(prices))
+        
+        # 1) Linear regression slope over the last lb prices (centered x, as in _detect_lr_trend)
+        x, sxx = self._x, self._sxx
+        slope = np.correlate(prices[1:], x, 'valid') / sxx if sxx > 0 else np.zeros(n - lb)
+        avg_price = np.correlate(prices[1:], np.full(lb, 1.0 / lb), 'valid')
+        norm_slope = np.divide(slope, avg_price, out=np.zeros(n - lb), where=avg_price > 0)
+        down = norm_slope < -self.slope_threshold
+        
+        # 2) Time-series momentum: mean of the lb returns
+        if lb >= 5:
+            down |= np.correlate(returns, np.ones(lb), 'valid') / lb < -self.mom_threshold
+        
+        # 3) Lag autocorrelation from raw sums over k = lb - lag aligned pairs
+        lag = self.ac_lag
+        if lb > lag + 5:
+            k = lb - lag
+            ones = np.ones(k)
+            sums = np.correlate(returns, ones, 'valid')
+            sq_sums = np.correlate(returns * returns, ones, 'valid')
+            s0, s1 = sums[:n - lb], sums[lag:]
+            cross = np.correlate(returns[:-lag] * returns[lag:], ones, 'valid') - s0 * s1 / k
+            ss0 = np.maximum(sq_sums[:n - lb] - s0 * s0 / k, 0.0)
+            ss1 = np.maximum(sq_sums[lag:] - s1 * s1 / k, 0.0)
+            down |= cross / (np.sqrt(ss0) * np.sqrt(ss1) + 1e-12) < -self.ac_threshold
+        
+        codes[lb:] = np.where(down, DOWN, UP)
+        return codes
+
+    def calculate_batch(self, prices_matrix, dtype=np.float64) -> np.ndarray:
+        """
+        Trend codes for many symbols' windows at once (one row per symbol, same window length).
+
+        Row i gives calculate_code(prices_matrix[i]); all rows are reduced together along axis 1
+        instead of one calculate() call per symbol.
+        
+        dtype: precision of the log-return pass. np.float32 makes np.log over a large batch
+        about twice as fast, at about 1e-7 absolute error per return, so rows right at a
+        threshold may flip; the returns are widened back to float64 for the reductions.
+        """
+        prices = np.asarray(prices_matrix, dtype=np.float64)
+        n_rows, width = prices.shape
+        codes = np.full(n_rows, UP, dtype=np.int8)
+        if n_rows == 0 or width == 0:
+            return codes
+        if USE_NUMBA and NUM_THREADS > 1 and n_rows >= _PARALLEL_MIN_SYMBOLS and dtype == np.float64:
+            return _trend_batch(np.ascontiguousarray(prices), self.lookback, self.slope_threshold,
+                                self.mom_threshold, self.ac_lag, self.ac_threshold, codes)
+
+        # Rows with nonpositive prices need the simple-return fallback; do those one by one
+        positive = (prices > 0).all(axis=1)
+        fallback = np.flatnonzero(~positive)
+        for i in fallback:
+            codes[i] = self.calculate_code(prices[i])
+        if len(fallback) == n_rows:
+            return codes
+        if len(fallback):
+            prices = prices[positive]
+
+        # 1) Linear regression slope over the last lb prices (centered x, as in _detect_lr_trend)
+        lb = min(self.lookback, width)
+        y = prices[:, -lb:]
+        x, sxx = (self._x, self._sxx) if lb == self.lookback else self._lr_axis(lb)
+        slope = y @ x / sxx if sxx > 0 else np.zeros(len(prices))
+        avg_price = y.sum(axis=1) / lb
+        norm_slope = np.divide(slope, avg_price, out=np.zeros(len(prices)), where=avg_price > 0)
+        down = norm_slope < -self.slope_threshold
+
+        # 2) Time-series momentum: mean of the last lb returns
+        lb = min(self.lookback, width - 1)
+        r = np.diff(np.log(prices[:, -(lb + 1):].astype(dtype, copy=False)), axis=1).astype(np.float64, copy=False)
+        if lb >= 5:
+            down |= r.sum(axis=1) / lb < -self.mom_threshold
+
+        # 3) Lag autocorrelation from raw sums over k = lb - lag aligned pairs
+        lag = self.ac_lag
+        if lb > lag + 5:
+            r0, r1 = r[:, :-lag], r[:, lag:]
+            k = lb - lag
+            s0 = r0.sum(axis=1)
+            s1 = r1.sum(axis=1)
+            cross = np.einsum('ij,ij->i', r0, r1) - s0 * s1 / k
+            ss0 = np.maximum(np.einsum('ij,ij->i', r0, r0) - s0 * s0 / k, 0.0)
+            ss1 = np.maximum(np.einsum('ij,ij->i', r1, r1) - s1 * s1 / k, 0.0)
+            down |= cross / (np.sqrt(ss0) * np.sqrt(ss1) + 1e-12) < -self.ac_threshold
+
+        codes[positive] = np.where(down, DOWN, UP)
+        return codes
 
     # -------- 1) Linear regression slope --------
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _lr_axis(lb: int):
+        """
+        x = 0..lb-1 centered on its mean, and sum(x^2) = lb(lb^2 - 1)/12.
+        Cached per length, so warm-up windows (lb < lookback) do not rebuild x every bar;
+        x is shared between callers and therefore read-only.
+        """
+        x = np.arange(lb, dtype=np.float64) - (lb - 1) / 2.0
+        x.flags.writeable = False
+        return x, lb * (lb * lb - 1) / 12.0
+
     def _detect_lr_trend(self, prices: np.ndarray):
         lb = min(self.lookback, len(prices))
         y = prices[-lb:]
-        x = np.arange(lb, dtype=np.float64)
 
-        slope, intercept = np.polyfit(x, y, 1)
-        avg_price = float(np.mean(y))
-        norm_slope = float(slope / avg_price) if avg_price > 0 else 0.0
+        # Closed-form OLS slope: with x centered on its mean, slope = (x . y) / sum(x^2),
+        # and sum(x^2) over 0..lb-1 is lb(lb^2 - 1)/12 (no Vandermonde/lstsq as in np.polyfit)
+        x, sxx = (self._x, self._sxx) if lb == self.lookback else self._lr_axis(lb)
+        slope = float(x @ y) / sxx if sxx > 0 else 0.0
+        avg_price = float(y.sum()) / lb
+        norm_slope = slope / avg_price if avg_price > 0 else 0.0
 
 
         if norm_slope > self.slope_threshold:
@@ -83,8 +415,9 @@ class TrendDetector:
             direction = TrendDirection.FLAT
 
         # strength: scale slope relative to threshold
+        # (plain float min/max: np.clip on a scalar costs more than the whole OLS above)
         strength = abs(norm_slope) / (abs(self.slope_threshold) + 1e-12)
-        strength = float(np.clip(strength, 0.0, 1.0))
+        strength = min(max(strength, 0.0), 1.0)
         return direction, strength
 
     # -------- 2) Time-series momentum --------
@@ -109,7 +442,10 @@ class TrendDetector:
         else:
             direction = TrendDirection.FLAT
 
-        strength = float(np.tanh(abs(mom_z) / 2.0))  #
+        # tanh(|z|/2) via its rational (Pade) approximation, clipped to 1: no libm call for a
+        # score that is only ever read as a bounded strength
+        z = abs(mom_z) * 0.5
+        strength = min(z * (27.0 + z * z) / (27.0 + 9.0 * z * z), 1.0)
         return direction, strength
 
     # -------- 3) Autocorrelation --------
@@ -124,11 +460,14 @@ class TrendDetector:
         r0 = r[:-lag]
         r1 = r[lag:]
 
-        # Pearson correlation
-        r0c = r0 - np.mean(r0)
-        r1c = r1 - np.mean(r1)
-        denom = (np.sqrt(np.sum(r0c**2)) * np.sqrt(np.sum(r1c**2)) + 1e-12)
-        ac = float(np.sum(r0c * r1c) / denom)
+        # Pearson correlation from raw sums (dot products, no centered temporaries)
+        k = len(r0)
+        s0 = float(r0.sum())
+        s1 = float(r1.sum())
+        cross = float(r0 @ r1) - s0 * s1 / k
+        ss0 = max(float(r0 @ r0) - s0 * s0 / k, 0.0)
+        ss1 = max(float(r1 @ r1) - s1 * s1 / k, 0.0)
+        ac = cross / (np.sqrt(ss0) * np.sqrt(ss1) + 1e-12)
 
         # Interpret:
         # + autocorr -> trend-friendly
@@ -144,12 +483,11 @@ class TrendDetector:
         return direction, strength
 
     # ------- getters -------
-    def get_trend(self, symbol: str) -> TrendDirection:
-        return self.current_trend[symbol]
-
-
+    def get_trend(self, state: TrendState) -> TrendDirection:
+        """Latest trend recorded in a symbol's streaming state."""
+        return _TRENDS_BY_CODE[state.trend]
 
-    def get_trend_stats(self, symbol: str) -> dict:
+    def get_trend_stats(self, state: TrendState) -> dict:
         return {
-            "trend": self.current_trend[symbol].value,
+            "trend": _TRENDS_BY_CODE[state.trend].value,
         }
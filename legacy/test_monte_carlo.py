@@ -3,6 +3,7 @@ Test script to verify Monte Carlo simulator integration with BacktestEngine.
 """
 import numpy as np
 import pandas as pd
+from unittest import mock
 from src.monte_carlo import MonteCarloSimulator
 
 def test_basic_functionality():
@@ -28,6 +29,10 @@ def test_basic_functionality():
     results = mc.run()
     print(f"   ✓ Generated {results.shape[1]} simulation paths")
     print(f"   ✓ Each path has {results.shape[0]} days")
+    frame = mc.to_frame()
+    assert frame.shape == results.shape
+    assert isinstance(mc.run(as_frame=True), pd.DataFrame)
+    print(f"   ✓ to_frame() returned a {frame.shape[0]}x{frame.shape[1]} DataFrame")
     
     # Test percentiles
     print("\n2. Testing percentile analysis...")
@@ -123,6 +128,7 @@ def test_error_handling():
         ("Negative simulations", lambda: MonteCarloSimulator(pd.Series([0.01, 0.02]), -100, 252)),
         ("Negative days", lambda: MonteCarloSimulator(pd.Series([0.01, 0.02]), 100, -252)),
         ("Negative initial value", lambda: MonteCarloSimulator(pd.Series([0.01, 0.02]), 100, 252, -1000)),
+        ("Unknown variance reduction", lambda: MonteCarloSimulator(pd.Series([0.01, 0.02]), 100, 252, variance_reduction='halton')),
     ]
     
     for test_name, test_func in test_cases:
@@ -142,6 +148,7 @@ def test_error_handling():
         ("calculate_var", lambda: mc.calculate_var()),
         ("calculate_cvar", lambda: mc.calculate_cvar()),
         ("get_summary_stats", lambda: mc.get_summary_stats()),
+        ("to_frame", lambda: mc.to_frame()),
     ]
     
     for method_name, method_func in methods_to_test:
@@ -155,11 +162,31 @@ def test_error_handling():
     print("✓ Error handling tests passed!")
     print("=" * 60)
 
+def test_seed_reproducible_across_thread_counts():
+    """Test that a seed gives the same paths whether blocks run on threads or serially."""
+    print("\n" + "=" * 60)
+    print("Testing Seeded Reproducibility Across Thread Counts")
+    print("=" * 60)
+    
+    returns = pd.Series(np.random.default_rng(0).normal(0.001, 0.02, 252))
+    
+    # Large enough to take the blocked path, with more than one block
+    runs = {}
+    for cpus in (1, 8):
+        with mock.patch('src.monte_carlo.os.cpu_count', return_value=cpus):
+            mc = MonteCarloSimulator(returns, num_simulations=20000, num_days=30,
+                                     initial_value=100.0, regime_aware=False, seed=7)
+            runs[cpus] = mc.run()
+    
+    assert np.array_equal(runs[1], runs[8])
+    print(f"   ✓ seed=7, {runs[1].shape[1]} simulations: serial and threaded paths are identical")
+
 if __name__ == "__main__":
     try:
         test_basic_functionality()
         test_integration_with_engine()
         test_error_handling()
+        test_seed_reproducible_across_thread_counts()
         
         print("\n" + "=" * 60)
         print("🎉 ALL TESTS PASSED! Monte Carlo simulator is ready.")
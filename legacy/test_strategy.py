@@ -0,0 +1,141 @@
+"""
+Test script to verify the batch (run_vectorized / calculate_series) and streaming (update / evaluate)
+paths give the same results as the strategy and detectors evaluated one bar at a time,
+and that the engine's summary statistics handle positions still open at the end.
+"""
+import numpy as np
+import pandas as pd
+from src.engine import BacktestEngine, LiveState
+from src.strategy import BuyLow
+from src.regimes import RegimeDetector, _REGIMES_BY_RANK
+from src.trends import TrendDetector, FLAT
+
+def make_prices(n, seed):
+    """Seeded random walk with volatility that switches every 200 bars, so regimes change."""
+    rng = np.random.default_rng(seed)
+    vol = np.repeat(rng.uniform(0.3, 3.0, n // 200 + 1), 200)[:n]
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n) * vol))
+
+def test_run_vectorized_matches_on_bar():
+    """Test that BuyLow.run_vectorized gives the same signals as on_bar on a fresh state."""
+    print("=" * 60)
+    print("Testing run_vectorized Against on_bar")
+    print("=" * 60)
+
+    prices = make_prices(3000, seed=11)
+    configs = [
+        dict(factor=(0.8, 0.5), stop_loss=0.8, timeframe_minutes=60),
+        dict(factor=(0.5, 0.4), stop_loss=0.6, timeframe_minutes=120, use_regime=False),
+        dict(factor=(1.0, 0.5), stop_loss=1.0, timeframe_minutes=30, use_trend=False),
+    ]
+
+    for cfg in configs:
+        strategy, state = BuyLow(**cfg), LiveState()
+        expected = np.array([strategy.on_bar({'close': price}, state) for price in prices])
+        signals = BuyLow(**cfg).run_vectorized(prices)
+        assert np.array_equal(signals, expected)
+        print(f"   ✓ {cfg}: {np.count_nonzero(expected)} signals match")
+
+    # One column per symbol gives the same signals as each symbol on its own
+    batch = np.column_stack([prices, make_prices(3000, seed=12)])
+    signals = BuyLow(**configs[0]).run_vectorized(batch)
+    for j in range(batch.shape[1]):
+        assert np.array_equal(signals[:, j], BuyLow(**configs[0]).run_vectorized(batch[:, j]))
+    print(f"   ✓ 2-D batch of {batch.shape[1]} symbols matches per-symbol runs")
+
+def test_detector_series_match_per_bar():
+    """Test that the detectors' calculate_series match their per-bar results."""
+    print("\n" + "=" * 60)
+    print("Testing calculate_series Against Per-Bar Detection")
+    print("=" * 60)
+
+    prices = make_prices(2000, seed=5)
+
+    regimes = RegimeDetector(lookback_window=390, regime_window=20)
+    state = regimes.new_state()
+    expected = [regimes.update(state, price) for price in prices]
+    assert np.array_equal(regimes.calculate_series(prices), expected)
+    print(f"   ✓ RegimeDetector: {len(set(expected))} distinct regimes match update()")
+
+    trends = TrendDetector(lookback=60)
+    expected = [trends.calculate_code(prices[max(0, t - 60):t + 1]) for t in range(len(prices))]
+    assert np.array_equal(trends.calculate_series(prices), expected)
+    print(f"   ✓ TrendDetector: {len(set(expected))} distinct trends match calculate_code()")
+
+def test_regime_update_matches_calculate():
+    """Test that the streaming RegimeDetector.update matches calculate() on the full history."""
+    print("\n" + "=" * 60)
+    print("Testing RegimeDetector.update Against calculate")
+    print("=" * 60)
+
+    # Several times lookback_window long, so the periodic re-sum of the running sums runs
+    prices = list(make_prices(1500, seed=3))
+    detector = RegimeDetector(lookback_window=300, regime_window=20)
+    state = detector.new_state()
+
+    for i, price in enumerate(prices, start=1):
+        streamed = _REGIMES_BY_RANK[detector.update(state, price)]
+        assert streamed == detector.calculate(prices[:i]), f"bar {i}"
+    print(f"   ✓ {len(prices)} bars match, through {len(prices) // 300} re-sums of the running sums")
+
+def test_trend_evaluate_matches_calculate_code():
+    """Test that streaming TrendDetector.evaluate matches calculate_code, including nonpositive prices."""
+    print("\n" + "=" * 60)
+    print("Testing TrendDetector.evaluate Against calculate_code")
+    print("=" * 60)
+
+    # Zero and negative prices switch the window to simple returns until they roll off
+    prices = make_prices(1000, seed=9)
+    prices[[200, 201, 450, 700]] = [-1.0, 0.0, -2.0, 0.0]
+    detector = TrendDetector(lookback=60, ac_lag=5)
+    state = detector.new_state()
+    assert detector.evaluate(state) == FLAT
+
+    for t, price in enumerate(prices):
+        detector.update(state, price)
+        window = prices[max(0, t - 60):t + 1]
+        assert state.nonpositive == np.count_nonzero(window <= 0), f"bar {t}"
+        if t >= 1:
+            assert detector.evaluate(state) == detector.calculate_code(window), f"bar {t}"
+    print(f"   ✓ {len(prices)} bars match, with nonpositive prices entering and leaving the window")
+
+def test_win_rate_with_open_positions():
+    """Test get_stats' win rate when some (or all) buys have no matching sell yet."""
+    print("\n" + "=" * 60)
+    print("Testing Win Rate With Open Positions")
+    print("=" * 60)
+
+    dates = pd.date_range('2024-01-02', periods=5, freq='D', tz='UTC')
+    engine = BacktestEngine(BuyLow(), pd.DataFrame({'close': 100.0}, index=dates), ['AAA', 'BBB'],
+                            enable_visualizer=False)
+    engine.equity_df = pd.DataFrame({'equity': [10000.0, 10010.0, 10020.0, 10030.0, 10040.0]}, index=dates)
+    buy = lambda symbol, day: {'type': 'buy', 'price': 100.0, 'date': dates[day], 'symbol': symbol,
+                               'shares': 50.0, 'cost': 5000.0}
+
+    # Only buys: no closed trades, so no proceeds column at all
+    engine.trades = [buy('AAA', 0)]
+    assert engine.get_stats()['Win Rate'] == "0.00%"
+    print("   ✓ Only buys: win rate 0.00%")
+
+    # One winning round trip plus a position still open on another symbol
+    engine.trades = [buy('AAA', 0), {'type': 'sell', 'price': 102.0, 'date': dates[2], 'symbol': 'AAA',
+                                     'shares': 50.0, 'proceeds': 5100.0}, buy('BBB', 3)]
+    assert engine.get_stats()['Win Rate'] == "100.00%"
+    print("   ✓ Closed winner plus open position: win rate 100.00%")
+
+if __name__ == "__main__":
+    try:
+        test_run_vectorized_matches_on_bar()
+        test_detector_series_match_per_bar()
+        test_regime_update_matches_calculate()
+        test_trend_evaluate_matches_calculate_code()
+        test_win_rate_with_open_positions()
+
+        print("\n" + "=" * 60)
+        print("🎉 ALL TESTS PASSED!")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()